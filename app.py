@@ -9,7 +9,7 @@ from streamlit_folium import st_folium
 from src.constants import APP_TITLE, APP_CAPTION
 from src.sidebar import render_sidebar                                          # builds the sidebar UI and returns inputs
 from src.data import load_df                                                    # loads & prepares parking dataset (cached)
-from src.rank import rank_candidates, nearest_street, snap_origin_to_dataset    # scoring + nearest-street helpers
+from src.rank import rank_candidates_cached, snap_origin_to_dataset, place_info    # scoring + nearest-street helpers
 from src.map_components import build_map                                        # constructs map
 from src.utils import fmt_dist                                                  # formats a distance
 
@@ -23,50 +23,37 @@ with st.sidebar:
         lat, lon,
         units, max_mi,
         alpha, beta, top_n,
-        show_heatmap, use_clustering, max_markers,
+        show_heatmap, use_clustering, max_markers, show_hexbins,
         update_on_map_click,
     ) = render_sidebar()
 
 
 # --- Data ---
-df, kdt, coords_rad = load_df("on_street_parking.csv")     # cached
+df, kdt, coords_xyz = load_df("on_street_parking.csv")     # cached (shared, read-only)
 
-lat, lon = snap_origin_to_dataset(df, lat, lon, kdt=kdt, coords_rad=coords_rad, max_snap_mi=2.0)
+# snapping already finds the nearest street segment: reuse it as the "closest" result
+lat, lon, closest_row, closest_dist_mi = snap_origin_to_dataset(df, lat, lon, kdt=kdt, coords_xyz=coords_xyz, max_snap_mi=2.0)
 # --- Ranking ---
-# top-N candidates by score = supply / (1 + alpha * distance^beta)
-ranked = rank_candidates(df, kdt, coords_rad, lat, lon, max_mi=max_mi, alpha=alpha, beta=beta, top_n=top_n)
+# top-N candidates by score = supply / (1 + alpha * distance^beta), cached per (rounded) origin + knobs
+ranked = rank_candidates_cached(df, kdt, coords_xyz, lat, lon, max_mi=max_mi, alpha=alpha, beta=beta, top_n=top_n)
 best = ranked.iloc[0]           # "best" is the first sorted row
-closest_row, closest_dist_mi = nearest_street(df, lat, lon)
-
-closest = {
-    "STREET": closest_row["STREET"],
-    "PRKG_SPLY": float(closest_row["PRKG_SPLY"]),
-    "center": [float(closest_row["center_lat"]), float(closest_row["center_lon"])],
-    "distance_mi": float(closest_dist_mi),
-    "distance_ft": float(closest_dist_mi * 5280.0),
-}
-optimal = {
-    "STREET": best["STREET"],
-    "PRKG_SPLY": float(best["PRKG_SPLY"]),
-    "center": [float(best["center_lat"]), float(best["center_lon"])],
-    "score": float(best["__score"]),
-    "distance_mi": float(best["__dist_mi"]),
-    "distance_ft": float(best["__dist_ft"]),
-}
+
+closest = place_info(closest_row, closest_dist_mi)
+optimal = place_info(best, best["__dist_mi"], score=best["__score"])
 
 gmap_origin = f"https://www.google.com/maps/search/?api=1&query={lat:.6f},{lon:.6f}"
 origin_str = f"[{lat:.6f}, {lon:.6f}]"
-closest_dist_str = fmt_dist(closest["distance_ft"], closest["distance_mi"], units)
-optimal_dist_str = fmt_dist(optimal["distance_ft"], optimal["distance_mi"], units)
+closest_dist_str = fmt_dist(closest.distance_ft, closest.distance_mi, units)
+optimal_dist_str = fmt_dist(optimal.distance_ft, optimal.distance_mi, units)
 
-gmap_opt = f"https://www.google.com/maps/search/?api=1&query={optimal['center'][0]},{optimal['center'][1]}"
-gmap_closest = f"https://www.google.com/maps/search/?api=1&query={closest['center'][0]},{closest['center'][1]}"
+gmap_opt = f"https://www.google.com/maps/search/?api=1&query={optimal.center_lat},{optimal.center_lon}"
+gmap_closest = f"https://www.google.com/maps/search/?api=1&query={closest.center_lat},{closest.center_lon}"
 
 # summary info above the map + google map links
 st.markdown(f"""
     **Search coordinates:** {origin_str}  
-    **Closest:** {closest['STREET']} — Spots Open: {int(closest['PRKG_SPLY'])}, Distance from Coordinate: **{closest_dist_str}**  
-    **Optimal:** {optimal['STREET']} — Spots Open: {int(optimal['PRKG_SPLY'])}, Distance from Coordinate: **{optimal_dist_str}**  
+    **Closest:** {closest.street} — Spots Open: {closest.supply}, Distance from Coordinate: **{closest_dist_str}**  
+    **Optimal:** {optimal.street} — Spots Open: {optimal.supply}, Distance from Coordinate: **{optimal_dist_str}**  
     [Open coordinates in Google Maps]({gmap_origin}) • [Open optimal in Google Maps]({gmap_opt}) • [Open closest in Google Maps]({gmap_closest})
 """)
 
@@ -83,6 +70,7 @@ m = build_map(
     show_heatmap=show_heatmap,
     use_clustering=use_clustering,
     max_markers=max_markers,
+    show_hexbins=show_hexbins,
 )
 map_state = st_folium(m, height=600, width=None)        # render the map inside streamlit
 if update_on_map_click and map_state and map_state.get("last_clicked"):
@@ -107,13 +95,13 @@ with cols[0]:
     if st.button("Bookmark Optimal"):
         st.session_state.setdefault("bookmarks", [])
         st.session_state.bookmarks.append({
-            "street": optimal["STREET"],
-            "lat": optimal["center"][0],
-            "lon": optimal["center"][1],
-            "supply": int(optimal["PRKG_SPLY"]),
-            "score": float(optimal["score"]),
-            "distance_mi": float(optimal["distance_mi"]),
-            "distance_ft": float(optimal["distance_ft"]),
+            "street": optimal.street,
+            "lat": optimal.center_lat,
+            "lon": optimal.center_lon,
+            "supply": optimal.supply,
+            "score": optimal.score,
+            "distance_mi": optimal.distance_mi,
+            "distance_ft": optimal.distance_ft,
         })
 with cols[1]:
     if units == "ft":
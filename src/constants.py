@@ -4,6 +4,14 @@ APP_CAPTION = "Enter coordinates, type an address, ask AI bot, or click the map
 
 FT_PER_MI = 5280.0
 EARTH_RADIUS_MI = 3958.7613  # miles
+COORD_CACHE_DECIMALS = 5      # round origins to ~1 m before using them as cache keys
+H3_RESOLUTION = 9             # hex-bin size for the optional supply layer (~0.1 km² per cell)
+
+# availability color buckets on EST_AVAILABLE (open spots), best first;
+# the last color is for anything below every threshold. Shared by markers, hexbins and legend.
+AVAILABILITY_THRESHOLDS = (16, 12, 8, 4)
+AVAILABILITY_COLORS = ("darkgreen", "lightgreen", "yellow", "orange", "red")
+AVAILABILITY_LABELS = ("Very High", "High", "Medium", "Low", "Very Low")
 
 HEATMAP_GRADIENT = { 
     "0.00": "red", 
@@ -13,6 +21,16 @@ HEATMAP_GRADIENT = {
     "1.00": "darkgreen",     
 }
 
+# Leaflet.markercluster options: add markers in non-blocking chunks, stop clustering
+# at street level, and keep only markers in the current view in the DOM
+CLUSTER_OPTIONS = {
+    "chunkedLoading": True,
+    "chunkInterval": 200,       # ms of work per chunk
+    "chunkDelay": 50,           # ms yielded to the browser between chunks
+    "disableClusteringAtZoom": 17,
+    "removeOutsideVisibleBounds": True,
+}
+
 CLUSTER_CSS = """
 <style>
 .marker-cluster-small { background-color: rgba(250, 81, 81, 0.75) !important; }
@@ -25,6 +43,20 @@ CLUSTER_CSS = """
 </style>
 """
 
+# Leaflet callback for FastMarkerCluster: builds each shaded circle client-side
+# row = [lat, lon, fill_color, tooltip_html]
+SHADED_MARKER_JS = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 5, color: "black", weight: 0.5,
+        fill: true, fillColor: row[2], fillOpacity: 0.6,
+        bubblingMouseEvents: false
+    });
+    marker.bindTooltip(row[3], {sticky: true});
+    return marker;
+}
+"""
+
 # ---- Geography (San Francisco bounding box) ----
 # west, south, east, north
 SF_BBOX = (-122.514, 37.708, -122.357, 37.832)
@@ -79,6 +111,8 @@ PRESETS = {
 OLLAMA_BASE = "http://localhost:11434"
 OLLAMA_URL  = f"{OLLAMA_BASE}/api/generate"
 OLLAMA_MODEL = "gemma3:4b"
+OLLAMA_KEEP_ALIVE = "30m"      # keep the model loaded between queries (no cold reload)
+OLLAMA_TIMEOUT = (2.0, 20.0)   # (connect, read) seconds: an unreachable server fails fast, a slow answer still streams
 
-OLLAMA_OPTIONS = {"temperature": 0.1}
+OLLAMA_OPTIONS = {"temperature": 0, "seed": 0, "num_predict": 128}   # deterministic (cacheable); the JSON answer is tiny
  
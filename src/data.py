@@ -1,88 +1,349 @@
+import os
 import re
 import numpy as np
 import pandas as pd
 import streamlit as st
-from .utils import parse_listish        # helper that turns coord strings into lists
+from .utils import availability_colors, unit_xyz     # availability color buckets, unit-sphere vectors
+from .constants import H3_RESOLUTION, AVAILABILITY_COLORS
+
+# copy-on-write: filtered frames share memory until written (always on from pandas 3.0)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.options.mode.copy_on_write = True
 
 try:
-    from sklearn.neighbors import KDTree
-    SKLEARN_OK = True
+    from scipy.spatial import cKDTree
+    SCIPY_OK = True
 except Exception:
-    KDTree = None
-    SKLEARN_OK = False
+    cKDTree = None
+    SCIPY_OK = False
 
-@st.cache_data
-def load_df(path="on_street_parking.csv"):
-    """
-    Load and normalize the on-street parking dataset, then build a KDTree
-    for fast nearest-neighbor searches.
+try:
+    from numba import njit, prange
+    NUMBA_OK = True
+except Exception:
+    njit = prange = None
+    NUMBA_OK = False
 
-    Returns:
-        df         : cleaned DataFrame with at least columns:
-                     ["center_lat", "center_lon", "STREET", "PRKG_SPLY", "EST_AVAILABLE", ...]
-        kdt        : sklearn.neighbors.KDTree built on (lat, lon) in radians, or None if unavailable
-        coords_rad : numpy array of coordinates in radians used to build KDTree (or None)
+try:
+    import h3
+    H3_OK = True
+except Exception:
+    h3 = None
+    H3_OK = False
+
+# Arrow-backed strings when pyarrow is installed, else pandas' own string dtype
+try:
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    STRING_DTYPE = "string"
+
+# "[lat, lon]" / "(lat, lon)" cells: the first two numbers of a list-like string
+_NUM = r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?"
+CENTER_PAIR = re.compile(rf"^\s*[\[(]\s*({_NUM})\s*,\s*({_NUM})")
+LIST_NUMBER = re.compile(rf"({_NUM})")
+# first / last "lon lat" pairs of a WKT LINESTRING. A token is a maximal run of number
+# characters; a pair is two tokens separated by spaces / tabs only, each fully matching
+# _NUM. The numba scanner below implements exactly this rule, so both paths agree.
+_WKT_NUM_CHARS = r"0-9.eE+\-"
+_WKT_PAIR = rf"(?<![{_WKT_NUM_CHARS}])({_NUM})[ \t]+({_NUM})(?![{_WKT_NUM_CHARS}])"
+WKT_FIRST_PAIR = re.compile(_WKT_PAIR, re.ASCII)
+WKT_LAST_PAIR = re.compile(r".*" + _WKT_PAIR, re.ASCII | re.DOTALL)     # greedy prefix lands on the last pair
+
+if NUMBA_OK:
+    @njit(cache=True)
+    def _wkt_number(buf, i, end):
+        """Parse buf[i:end] if the whole token matches _NUM (-?d+[.d+][(e|E)[+-]d+]); else NaN."""
+        neg = False
+        if i < end and buf[i] == 45:        # '-'
+            neg = True
+            i += 1
+        mant = 0
+        ndig = 0
+        scale = 0                           # decimal exponent applied to mant
+        n_int = 0
+        while i < end and 48 <= buf[i] <= 57:
+            if ndig < 18:                   # int64-safe; extra digits are below float precision
+                mant = mant * 10 + (buf[i] - 48)
+                ndig += 1
+            else:
+                scale += 1
+            n_int += 1
+            i += 1
+        if n_int == 0:
+            return np.nan
+        if i < end and buf[i] == 46:        # '.' needs at least one digit after it
+            i += 1
+            n_frac = 0
+            while i < end and 48 <= buf[i] <= 57:
+                if ndig < 18:
+                    mant = mant * 10 + (buf[i] - 48)
+                    ndig += 1
+                    scale -= 1
+                n_frac += 1
+                i += 1
+            if n_frac == 0:
+                return np.nan
+        if i < end and (buf[i] == 101 or buf[i] == 69):      # 'e' / 'E'
+            i += 1
+            exp_neg = False
+            if i < end and (buf[i] == 43 or buf[i] == 45):   # '+' / '-'
+                exp_neg = buf[i] == 45
+                i += 1
+            exp = 0
+            n_exp = 0
+            while i < end and 48 <= buf[i] <= 57:
+                if exp < 10000:
+                    exp = exp * 10 + (buf[i] - 48)
+                n_exp += 1
+                i += 1
+            if n_exp == 0:
+                return np.nan
+            scale += -exp if exp_neg else exp
+        if i != end:                        # trailing characters: not a _NUM token
+            return np.nan
+        v = mant * 10.0 ** scale if scale >= 0 else mant / 10.0 ** -scale
+        return -v if neg else v
+
+    @njit(cache=True)
+    def _is_num_char(c):
+        # digits . e E + -  (the _WKT_NUM_CHARS class)
+        return (48 <= c <= 57) or c == 46 or c == 101 or c == 69 or c == 43 or c == 45
+
+    @njit(cache=True)
+    def _wkt_pairs(buf, a, b):
+        """
+        First and last "x y" pairs within buf[a:b], per the WKT_FIRST_PAIR / WKT_LAST_PAIR
+        rule. Returns (x0, y0, x1, y1), NaN where no pair exists.
+        """
+        x0 = y0 = x1 = y1 = np.nan
+        found = False
+        i = a
+        while i < b:
+            while i < b and not _is_num_char(buf[i]):
+                i += 1
+            s0 = i
+            while i < b and _is_num_char(buf[i]):
+                i += 1
+            e0 = i
+            if s0 == e0:
+                break
+            j = e0
+            while j < b and (buf[j] == 32 or buf[j] == 9):
+                j += 1
+            if j == e0 or j >= b or not _is_num_char(buf[j]):
+                continue                    # next token isn't separated by blanks only
+            s1 = j
+            while j < b and _is_num_char(buf[j]):
+                j += 1
+            x = _wkt_number(buf, s0, e0)
+            y = _wkt_number(buf, s1, j)
+            if not (np.isnan(x) or np.isnan(y)):
+                if not found:
+                    x0, y0 = x, y
+                    found = True
+                x1, y1 = x, y
+            i = s1                          # the second token may start the next pair
+        return x0, y0, x1, y1
+
+    @njit(parallel=True, cache=True)
+    def _wkt_midpoints_nb(buf, offsets):
+        """(lat, lon) midpoint of the first and last vertex of every WKT string in buf."""
+        n = len(offsets) - 1
+        out = np.full((n, 2), np.nan)
+        for r in prange(n):
+            a, b = offsets[r], offsets[r + 1]
+            x0, y0, x1, y1 = _wkt_pairs(buf, a, b)
+            out[r, 0] = (y0 + y1) / 2.0
+            out[r, 1] = (x0 + x1) / 2.0
+        return out
+
+# loading the compiled scanner costs ~0.2 s once; str.extract is ~5 us/row,
+# so the byte scan only pays off on larger files
+WKT_NUMBA_MIN_ROWS = 50_000
+
+def _wkt_midpoints(shape):
+    """
+    (lat, lon) midpoints of the first / last WKT vertices. With numba (and enough rows):
+    one parallel byte scan over all strings packed into a single buffer; else two
+    str.extract passes.
     """
-    df = pd.read_csv(path)
+    if NUMBA_OK and len(shape) >= WKT_NUMBA_MIN_ROWS:
+        parts = [v.encode("ascii", "replace") if isinstance(v, str) else b"" for v in shape.tolist()]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        buf = np.frombuffer(b"".join(parts), dtype=np.uint8)
+        mid = _wkt_midpoints_nb(buf, offsets)
+        return mid[:, 0], mid[:, 1]
+    # one vectorized pass per endpoint instead of a Python regex call per row
+    shape = shape.astype("string")
+    first = shape.str.extract(WKT_FIRST_PAIR).astype(float)     # columns: lon, lat
+    last = shape.str.extract(WKT_LAST_PAIR).astype(float)
+    return ((first[1] + last[1]) / 2.0).to_numpy(), ((first[0] + last[0]) / 2.0).to_numpy()
+
+def _listish_mean(col):
+    """Mean of the numbers in each "[a, b, ...]" / "(a, b, ...)" cell; NaN for anything else."""
+    s = col.astype(STRING_DTYPE).str.strip()
+    listish = (s.str.startswith("[") | s.str.startswith("(")).fillna(False).astype(bool)
+    nums = s[listish].str.extractall(LIST_NUMBER)[0].astype(float)
+    return nums.groupby(level=0).mean().reindex(col.index)
+
+def _add_h3_cells(df):
+    """H3 cell per segment (optional) so the map can hex-bin supply without touching raw rows."""
+    df["h3_cell"] = [
+        h3.latlng_to_cell(la, lo, H3_RESOLUTION)
+        for la, lo in zip(df["center_lat"].to_numpy(dtype=float), df["center_lon"].to_numpy(dtype=float))
+    ]
+
+# bump when _parse_csv adds / changes columns, so older sidecars are not picked up
+SIDECAR_VERSION = 5
+
+def _read_sidecar(path, sidecar):
+    """Parsed frame from the parquet sidecar, or None if missing / older than the CSV / unreadable."""
+    try:
+        if os.path.getmtime(sidecar) < os.path.getmtime(path):
+            return None
+        return pd.read_parquet(sidecar)
+    except Exception:      # no sidecar yet, no parquet engine, or a corrupt file: re-parse the CSV
+        return None
+
+def _write_sidecar(df, sidecar):
+    try:
+        df.to_parquet(sidecar, index=False)
+    except Exception:      # read-only checkout / no parquet engine: the CSV path still works
+        pass
+
+def _read_csv(path):
+    """pandas.read_csv on the multithreaded pyarrow engine (~3x faster here), else the default C engine."""
+    try:
+        return pd.read_csv(path, engine="pyarrow")
+    except Exception:      # pyarrow missing, or a file its stricter parser rejects
+        return pd.read_csv(path)
+
+def _parse_csv(path):
+    """Read the raw CSV and derive every column the app needs (the slow, cold-start part)."""
+    df = _read_csv(path)
 
     # preferred: existing 'center' as [lat, lon]
+    # one C-level regex pass pulls both numbers out (no per-row literal parsing)
     if "center" in df.columns:
-        c = df["center"].apply(parse_listish)   # parse strings like "[lat, lon]" into [lat, lon]
-        if c.notna().any():
-            # pull out lat/lon into separate numeric columns
-            df["center_lat"] = c.apply(lambda x: x[0] if isinstance(x, (list, tuple)) and len(x) >= 2 else np.nan)
-            df["center_lon"] = c.apply(lambda x: x[1] if isinstance(x, (list, tuple)) and len(x) >= 2 else np.nan)
+        c = df["center"].astype(STRING_DTYPE).str.extract(CENTER_PAIR).astype(float)
+        if c[0].notna().any():
+            df["center_lat"] = c[0]
+            df["center_lon"] = c[1]
 
     # fallback A: if theres no usable "center" values
     # but do have "latitude" and "longitude" columns that contain arrays
     # take the midpoint (mean) of each array as the center.
     if ("center_lat" not in df.columns) or ("center_lon" not in df.columns) or df["center_lat"].isna().all():
         if "latitude" in df.columns and "longitude" in df.columns:
-            lat_lists = df["latitude"].apply(parse_listish)
-            lon_lists = df["longitude"].apply(parse_listish)
-            if lat_lists.notna().any() and lon_lists.notna().any():
-                df["center_lat"] = lat_lists.apply(lambda xs: float(np.mean(xs)) if isinstance(xs, (list, tuple)) and len(xs) else np.nan)
-                df["center_lon"] = lon_lists.apply(lambda xs: float(np.mean(xs)) if isinstance(xs, (list, tuple)) and len(xs) else np.nan)
+            # every number of every "[...]" cell in one extractall, then a grouped mean per row
+            lat_mean = _listish_mean(df["latitude"])
+            lon_mean = _listish_mean(df["longitude"])
+            if lat_mean.notna().any() and lon_mean.notna().any():
+                df["center_lat"] = lat_mean
+                df["center_lon"] = lon_mean
 
     # fallback B: if still don’t have center coords, but have a WKT LINESTRING in "shape"
     # e.g. "LINESTRING(-122.42 37.77, -122.41 37.78, ...)" (lon lat),
     # compute the midpoint as the average of first and last vertices.
     if (("center_lat" not in df.columns) or df["center_lat"].isna().all()) and ("shape" in df.columns):
-        def wkt_midpoint(wkt):
-            if not isinstance(wkt, str):
-                return np.nan, np.nan
-            # get all "lon lat" float pairs in the WKT string
-            pairs = re.findall(r"(-?\d+\.\d+)\s+(-?\d+\.\d+)", wkt)
-            if not pairs:
-                return np.nan, np.nan
-            lon1, lat1 = map(float, pairs[0])
-            lon2, lat2 = map(float, pairs[-1])
-            #  midpoint of endpoints (lat, lon) order for consistency elsewhere
-            return (lat1 + lat2) / 2.0, (lon1 + lon2) / 2.0
-        latlon = df["shape"].apply(wkt_midpoint)
-        df["center_lat"] = latlon.apply(lambda t: t[0])
-        df["center_lon"] = latlon.apply(lambda t: t[1])
-
-    # drop any rows where failed to get coordinates
-    df = df.dropna(subset=["center_lat", "center_lon"]).copy()
+        #  midpoint of endpoints (lat, lon) order for consistency elsewhere
+        df["center_lat"], df["center_lon"] = _wkt_midpoints(df["shape"])
+
+    # drop any rows where failed to get coordinates (no explicit .copy(): copy-on-write covers it)
+    df = df.loc[df[["center_lat", "center_lon"]].notna().all(axis=1)].reset_index(drop=True)
 
     if "STREET" not in df.columns:
-        street_name = df.get("ST_NAME", pd.Series([""] * len(df))).fillna("")
-        street_type = df.get("ST_TYPE", pd.Series([""] * len(df))).fillna("")
+        street_name = df.get("ST_NAME", pd.Series("", index=df.index)).astype(STRING_DTYPE).fillna("")
+        street_type = df.get("ST_TYPE", pd.Series("", index=df.index)).astype(STRING_DTYPE).fillna("")
         df["STREET"] = (street_name + " " + street_type).str.strip()
+    # street labels repeat a lot: category when low-cardinality, else a vectorized string dtype
+    street = df["STREET"].astype(STRING_DTYPE)
+    df["STREET"] = street.astype("category") if street.nunique() < 0.5 * len(street) else street
 
     if "PRKG_SPLY" not in df.columns:
         df["PRKG_SPLY"] = 0
-    df["PRKG_SPLY"] = pd.to_numeric(df["PRKG_SPLY"], errors="coerce").fillna(0).astype(float)
-    df["EST_AVAILABLE"] = (df["PRKG_SPLY"] * 0.3).astype(float)     # estimate about 30% parking spots are free
+    # supply is a whole count of spaces: int32 is exact and half the bytes of float64
+    df["PRKG_SPLY"] = pd.to_numeric(df["PRKG_SPLY"], errors="coerce").fillna(0).round().astype(np.int32)
+    df["EST_AVAILABLE"] = df["PRKG_SPLY"].astype(np.float32) * np.float32(0.3)     # estimate about 30% parking spots are free
+
+    # radians + cos(lat) are pure functions of the coordinates; compute them once here
+    # so every ranking / nearest-street call can skip the per-click trig over all rows
+    df["center_lat_rad"] = np.radians(df["center_lat"].to_numpy(dtype=float))
+    df["center_lon_rad"] = np.radians(df["center_lon"].to_numpy(dtype=float))
+    df["center_cos_lat"] = np.cos(df["center_lat_rad"].to_numpy())
+
+    if H3_OK:
+        _add_h3_cells(df)
+
+    # float32 is plenty here (~0.4 m at SF latitudes) and halves the bytes every distance pass touches;
+    # the radian columns above are derived from the float64 values first, then narrowed
+    f32_cols = ["center_lat", "center_lon", "EST_AVAILABLE",
+                "center_lat_rad", "center_lon_rad", "center_cos_lat"]
+    df[f32_cols] = df[f32_cols].astype(np.float32)
+
+    # half-angle sin/cos: sin((phi - phi1)/2) = sin(phi/2)cos(phi1/2) - cos(phi/2)sin(phi1/2),
+    # so the no-tree haversine is multiply/adds per row instead of two sin() calls.
+    # Kept float64 (from the narrowed radians, i.e. the same points as the tree): the
+    # subtraction cancels at block-scale distances, and float32 factors leave ~0.4% error there
+    half_lat = df["center_lat_rad"].to_numpy(dtype=float) / 2.0
+    half_lon = df["center_lon_rad"].to_numpy(dtype=float) / 2.0
+    df["center_sin_hlat"], df["center_cos_hlat"] = np.sin(half_lat), np.cos(half_lat)
+    df["center_sin_hlon"], df["center_cos_hlon"] = np.sin(half_lon), np.cos(half_lon)
+
+    # marker color bucket per row, so map rebuilds just index into it
+    df["_color"] = pd.Categorical(availability_colors(df["EST_AVAILABLE"].to_numpy()), categories=AVAILABILITY_COLORS)
+    # heatmap weight per row (only depends on the data): ~1.0 at 16+ open spots, squared so green stays rare
+    green_at, sharpness = 16.0, 2.0
+    df["_heat_weight"] = ((df["EST_AVAILABLE"].to_numpy(dtype=np.float32) / np.float32(green_at)).clip(0, 1)
+                          ** np.float32(sharpness)).astype(np.float32)
+
+    # fixed random draw order for the shaded-marker sample: the first n entries are exactly
+    # df.sample(n, random_state=42), so the map slices it instead of reshuffling per rerun.
+    # (a column rather than df.attrs: it survives the parquet sidecar and row-wise ops)
+    df["_marker_order"] = np.random.RandomState(42).permutation(len(df)).astype(np.int32)
+    return df
+
+# cache_resource: one shared (read-only) copy returned by reference, instead of
+# st.cache_data unpickling the frame + tree on every rerun
+@st.cache_resource(ttl=24*3600)
+def load_df(path="on_street_parking.csv"):
+    """
+    Load and normalize the on-street parking dataset, then build a cKDTree on
+    unit-sphere (x, y, z) vectors for fast nearest-neighbor searches: the Euclidean
+    chord between unit vectors is monotonic in great-circle distance, so radius / k-NN
+    results are exactly the haversine ones.
+    The returned objects are shared across reruns and sessions: treat them as read-only.
+
+    The parsed frame is also written to a "<path>.v<N>.parquet" sidecar, so a cold start
+    after a restart / code change reads parquet (dtypes included) instead of re-parsing
+    the CSV. The sidecar is ignored once the CSV is newer than it.
+
+    Returns:
+        df         : cleaned DataFrame with at least columns:
+                     ["center_lat", "center_lon", "STREET", "PRKG_SPLY", "EST_AVAILABLE",
+                      "center_lat_rad", "center_lon_rad", "center_cos_lat",
+                      "center_sin_hlat", "center_cos_hlat", "center_sin_hlon", "center_cos_hlon", ...]
+                     plus "h3_cell" when the optional h3 package is installed
+        kdt        : scipy.spatial.cKDTree built on coords_xyz, or None if unavailable
+        coords_xyz : (N, 3) numpy array of unit-sphere vectors (the tree's points; always built)
+    """
+    sidecar = f"{path}.v{SIDECAR_VERSION}.parquet"
+    df = _read_sidecar(path, sidecar)
+    if df is None:
+        df = _parse_csv(path)
+        _write_sidecar(df, sidecar)
+    elif H3_OK and "h3_cell" not in df.columns:
+        _add_h3_cells(df)      # sidecar was written before h3 was installed
 
+    # unit vectors are cheap and also serve the no-tree scans (chord distance, no trig per query)
+    coords_xyz = unit_xyz(df["center_lat_rad"].to_numpy(dtype=float), df["center_lon_rad"].to_numpy(dtype=float))
     kdt = None
-    coords_rad = None
-    if SKLEARN_OK:
+    if SCIPY_OK:
         try:
-            coords_rad = np.radians(df[["center_lat", "center_lon"]].to_numpy())
-            kdt = KDTree(coords_rad, metric="haversine")  # radians
+            # C-level tree on 3-D Euclidean points (faster queries than a haversine BallTree)
+            kdt = cKDTree(coords_xyz)
         except Exception:
-            kdt, coords_rad = None, None
+            kdt = None
 
-    return df, kdt, coords_rad
+    return df, kdt, coords_xyz
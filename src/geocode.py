@@ -1,5 +1,7 @@
 # src/geocode.py
 import re
+from concurrent.futures import ThreadPoolExecutor
+import time
 import streamlit as st
 from .constants import SF_BBOX, POI_COORDS, POI_ALIASES
 GEOCODER = None
@@ -20,6 +22,19 @@ try:
 except Exception:
     pass
 
+# optional on-disk cache so geocodes survive Streamlit restarts
+try:
+    import diskcache
+    DISKCACHE_OK = True
+except Exception:
+    diskcache = None
+    DISKCACHE_OK = False
+
+GEOCODE_TTL_S = 7 * 24 * 3600
+GEOCODE_TIMEOUT_S = 4.0
+_DISK_CACHE = None
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geocode")  # shared by all sessions
+
 # -------- Helpers --------
 def in_sf_bounds(lat: float, lon: float) -> bool:
     return (SF_BBOX[1] <= float(lat) <= SF_BBOX[3]) and (SF_BBOX[0] <= float(lon) <= SF_BBOX[2])
@@ -28,17 +43,23 @@ def in_sf_bounds(lat: float, lon: float) -> bool:
 def _normalize_key(s: str) -> str:
     return re.sub(r"[^a-z0-9 ]+", "", (s or "").lower()).strip()
 
+# every POI key in one alternation (longest first, so "sf city hall" beats "city hall"):
+# a single C-level scan of the query instead of one substring test per POI
+_POI_RE = re.compile("|".join(re.escape(k) for k in sorted(POI_COORDS, key=len, reverse=True)))
+
 def _match_poi_coords(raw_query: str):
     """
     substring match for known POIs(point of interest).
     """
     key = _normalize_key(raw_query)
-    # Remove trailing city if present so substring checks are cleaner
-    key_cityless = re.sub(r"\b(san\s*francisco|sf|s\.f\.)\b.*$", "", key).strip()
-
-    for k, coords in POI_COORDS.items():
-        if k in key or k in key_cityless:
-            return coords
+    # exact hit (the common case: the user typed just the POI name)
+    coords = POI_COORDS.get(key)
+    if coords:
+        return coords
+    # the city-stripped query is a prefix of key, so searching key alone covers both
+    m = _POI_RE.search(key)
+    if m:
+        return POI_COORDS[m.group(0)]
     # Special spacing-insensitive case
     if "pier39" in key.replace(" ", ""):
         return POI_COORDS["pier39"]
@@ -56,14 +77,70 @@ def ensure_sf(query: str) -> str:
         q = f"{q}, San Francisco, CA"
     return q
 
-@st.cache_data(show_spinner=False, ttl=7*24*3600)
+def _disk_cache():
+    """Lazily open the on-disk cache (None if diskcache is missing or the dir is unwritable)."""
+    global _DISK_CACHE
+    if _DISK_CACHE is None and DISKCACHE_OK:
+        try:
+            _DISK_CACHE = diskcache.Cache(".geocode_cache")
+        except Exception:
+            return None
+    return _DISK_CACHE
+
+def _geocode_nominatim(q: str):
+    # Nominatim with SF bounding box (lon/lat order)
+    loc = GEOCODER.geocode(
+        q,
+        country_codes="us",
+        viewbox=[SF_BBOX[0], SF_BBOX[1], SF_BBOX[2], SF_BBOX[3]],  # west,south,east,north
+        bounded=True,
+        exactly_one=True,
+        addressdetails=False,
+    )
+    if loc and in_sf_bounds(loc.latitude, loc.longitude):
+        return (float(loc.latitude), float(loc.longitude))
+    return None
+
+def _geocode_arcgis(q: str):
+    # ArcGIS fallback (still enforce SF bounds)
+    loc = GEOCODER_FALLBACK.geocode(q)
+    if loc and in_sf_bounds(loc.latitude, loc.longitude):
+        return (float(loc.latitude), float(loc.longitude))
+    return None
+
+def _geocode_network(q: str):
+    """
+    Query Nominatim and ArcGIS concurrently; Nominatim's (SF-bounded) answer wins
+    when it arrives in time, otherwise take ArcGIS. Both share one timeout budget,
+    so a slow provider costs at most GEOCODE_TIMEOUT_S instead of stacking.
+    """
+    futures = []
+    if GEOCODER:
+        futures.append(_EXECUTOR.submit(_geocode_nominatim, q))
+    if GEOCODER_FALLBACK:
+        futures.append(_EXECUTOR.submit(_geocode_arcgis, q))
+
+    deadline = time.monotonic() + GEOCODE_TIMEOUT_S
+    for fut in futures:     # priority order
+        try:
+            res = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:     # timeout or provider error
+            continue
+        if res:
+            for other in futures:
+                other.cancel()
+            return res
+    return None
+
+@st.cache_data(show_spinner=False, ttl=GEOCODE_TTL_S)
 def geocode_cached(query: str):
     """
     Geocode with a strong SF bias:
       0) Try POI short-circuit (no network).
       1) Normalize to SF string.
-      2) Nominatim with SF viewbox + bounded=True.
-      3) ArcGIS fallback.
+      2) On-disk cache (optional diskcache), so restarts don't hit the network again.
+      3) Nominatim with SF viewbox + bounded=True and ArcGIS, in parallel;
+         Nominatim wins if it answers within the timeout.
       4) Reject results outside SF bbox.
     Returns (lat, lon) or None.
     """
@@ -79,29 +156,22 @@ def geocode_cached(query: str):
     # 1) Then bias the text to SF (aliases or append ', San Francisco, CA')
     q = ensure_sf(raw)
 
-    # 2) Nominatim with SF bounding box (lon/lat order)
-    if GEOCODER:
+    # 2) on-disk cache (survives restarts), keyed on the normalized query
+    cache = _disk_cache()
+    key = _normalize_key(q)
+    if cache is not None:
         try:
-            loc = GEOCODER.geocode(
-                q,
-                country_codes="us",
-                viewbox=[SF_BBOX[0], SF_BBOX[1], SF_BBOX[2], SF_BBOX[3]],  # west,south,east,north
-                bounded=True,
-                exactly_one=True,
-                addressdetails=False,
-            )
-            if loc and in_sf_bounds(loc.latitude, loc.longitude):
-                return (float(loc.latitude), float(loc.longitude))
+            hit = cache.get(key)
+            if hit is not None:
+                return tuple(hit)
         except Exception:
             pass
 
-    # 3) ArcGIS fallback (still enforce SF bounds)
-    if GEOCODER_FALLBACK:
+    # 3) Nominatim with SF viewbox + ArcGIS fallback, queried concurrently
+    res = _geocode_network(q)
+    if res and cache is not None:
         try:
-            loc = GEOCODER_FALLBACK.geocode(q)
-            if loc and in_sf_bounds(loc.latitude, loc.longitude):
-                return (float(loc.latitude), float(loc.longitude))
+            cache.set(key, res, expire=GEOCODE_TTL_S)    # only successes: misses may be transient
         except Exception:
             pass
-
-    return None
+    return res
@@ -1,35 +1,165 @@
 # src/map_components.py
 import folium
 from folium import Tooltip
-from folium.plugins import MarkerCluster, HeatMap
+from folium.plugins import FastMarkerCluster, HeatMap
+import numpy as np
 import pandas as pd  # for quantiles
-from .constants import CLUSTER_CSS, HEATMAP_GRADIENT
+import streamlit as st
+from .constants import CLUSTER_CSS, CLUSTER_OPTIONS, HEATMAP_GRADIENT, SHADED_MARKER_JS, AVAILABILITY_COLORS, AVAILABILITY_LABELS
+from .utils import availability_colors
+
+try:
+    import h3
+except Exception:
+    h3 = None
+
+# This legend explains the coloring of the street markers; static, so built once at import.
+_LEGEND_ROWS = "".join(
+    f'<i style="background:{color}; width:10px; height:10px; float:left; margin-right:6px;"></i> {label}<br>'
+    for color, label in zip(AVAILABILITY_COLORS[::-1], AVAILABILITY_LABELS[::-1])
+)
+LEGEND_HTML = f"""
+<div style="position: fixed; bottom: 50px; left: 50px; width: 200px; height: 170px;
+     background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
+     padding: 10px;">
+     <b>Estimated Availability</b><br>
+     {_LEGEND_ROWS}
+</div>
+"""
+# shared DOM elements: the same strings wrapped once, added to every map's root
+LEGEND_ELEMENT = folium.Element(LEGEND_HTML)
+CLUSTER_ELEMENT = folium.Element(CLUSTER_CSS)
+
+@st.cache_data(show_spinner=False)
+def build_heat_points(_df, n_rows):
+    """
+    (N, 3) array of [lat, lon, weight] for the heatmap. Pure function of the
+    (static, cached) dataset, so it is built once instead of on every rerun;
+    n_rows is only part of the cache key (_df itself is not hashed).
+    The weights themselves are precomputed by load_df ("_heat_weight").
+    """
+    weights = np.round(_df["_heat_weight"].to_numpy(dtype=float), 4)
+    # 6 decimals (~0.1 m) keeps the serialized map small
+    lats = np.round(_df["center_lat"].to_numpy(dtype=float), 6)
+    lons = np.round(_df["center_lon"].to_numpy(dtype=float), 6)
+    return np.column_stack([lats, lons, weights])
+
+@st.cache_data(show_spinner=False)
+def build_hex_geojson(_df, n_rows):
+    """
+    GeoJSON FeatureCollection of H3 hexagons with summed EST_AVAILABLE per cell.
+    A few hundred polygons stand in for thousands of markers; colors use the same
+    5 legend buckets, by quantile of the per-hex totals.
+    """
+    # factorize + bincount: C-level sums / counts per cell instead of the groupby hash path
+    # (cells keep first-appearance order, like groupby(sort=False))
+    codes, cells = pd.factorize(_df["h3_cell"])
+    supply = pd.to_numeric(_df["EST_AVAILABLE"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    est = np.bincount(codes, weights=supply, minlength=len(cells))
+    counts = np.bincount(codes, minlength=len(cells))
+    if len(est) >= 5:
+        bucket = pd.qcut(pd.Series(est).rank(method="first"), 5, labels=False).to_numpy()
+    else:
+        bucket = np.full(len(est), 2)
+    palette = np.array(AVAILABILITY_COLORS[::-1])     # bucket 0 = lowest quintile
+    colors = palette[bucket]
+
+    features = []
+    for cell, total, n, color in zip(cells.tolist(), est.tolist(), counts.tolist(), colors.tolist()):
+        ring = [[round(lng, 6), round(lat, 6)] for lat, lng in h3.cell_to_boundary(cell)]
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"color": color, "tip": f"Est Avail: {int(total)}<br>Segments: {n}"},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+@st.cache_data(show_spinner=False)
+def build_marker_rows(_df, n_rows, max_markers):
+    """
+    [lat, lon, color, tooltip] rows for the shaded-marker layer (a sample of the dataset).
+    Independent of the origin, so reruns that only move the point reuse it;
+    n_rows / max_markers are the cache key (_df itself is not hashed).
+    """
+    # sample for performance (draw order precomputed in load_df; same rows as df.sample)
+    if "_marker_order" in _df.columns:
+        subset = _df.iloc[_df["_marker_order"].to_numpy()[:max_markers]]
+    else:
+        subset = _df.sample(min(len(_df), max_markers), random_state=42)
+
+    # colors come precomputed from load_df; tooltips for the whole subset in one vector pass
+    est_open = pd.to_numeric(subset["EST_AVAILABLE"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    colors = subset["_color"].to_numpy(dtype=object) if "_color" in subset.columns else availability_colors(est_open)
+    tooltips = (subset["STREET"].astype(str) + "<br>Est Avail: " + est_open.astype(int).astype(str)).tolist()
+    # 6 decimals (~0.1 m): float32 coords otherwise serialize as 17-digit floats
+    lats = np.round(subset["center_lat"].to_numpy(dtype=float), 6).tolist()
+    lons = np.round(subset["center_lon"].to_numpy(dtype=float), 6).tolist()
+    return [list(r) for r in zip(lats, lons, colors.tolist(), tooltips)]
+
+def _add_shaded_markers(m, df, use_clustering, max_markers):
+    """Add the availability-colored circle markers (a sample of df) to map m."""
+    rows = build_marker_rows(df, len(df), max_markers)
+
+    # one batched layer instead of N folium.CircleMarker objects
+    if use_clustering:
+        # rows are serialized once; the JS callback builds the circles in the browser
+        FastMarkerCluster(
+            data=rows,
+            callback=SHADED_MARKER_JS,
+            options=CLUSTER_OPTIONS,
+        ).add_to(m)
+    else:
+        # one GeoJSON layer per color bucket (under a single toggle): the fill color is a
+        # constant of the layer's marker, so folium skips the per-feature style_function pass
+        by_color = {color: [] for color in AVAILABILITY_COLORS}
+        for lat_c, lon_c, color, tip in rows:
+            by_color.setdefault(color, []).append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon_c, lat_c]},
+                "properties": {"tip": tip},
+            })
+        group = folium.FeatureGroup(name="Shaded markers")
+        for color, features in by_color.items():
+            if not features:
+                continue
+            folium.GeoJson(
+                {"type": "FeatureCollection", "features": features},
+                name=color,
+                marker=folium.CircleMarker(
+                    radius=5, color="black", weight=0.5, fill=True, fill_color=color, fill_opacity=0.6,
+                    **{"bubblingMouseEvents": False}
+                ),
+                tooltip=folium.GeoJsonTooltip(fields=["tip"], labels=False, sticky=True),
+            ).add_to(group)
+        group.add_to(m)
 
 def build_map(
     df, lat, lon, closest, optimal, ranked, units,
-    show_heatmap=False, use_clustering=True, max_markers=1500,
+    show_heatmap=False, use_clustering=True, max_markers=1500, show_hexbins=False,
 ):
     # Create base map centered on the user's point
-    m = folium.Map(location=[lat, lon], zoom_start=15)
+    # canvas renderer: circle markers / hexagons draw into one <canvas> instead of one SVG node each
+    m = folium.Map(location=[lat, lon], zoom_start=15, prefer_canvas=True)
 
     # ----- distances shown in the two main tooltips -----
-    closest_dist_str = f"{closest['distance_ft']:.0f} ft" if units == "ft" else f"{closest['distance_mi']:.2f} mi"
-    optimal_dist_str = f"{optimal['distance_ft']:.0f} ft" if units == "ft" else f"{optimal['distance_mi']:.2f} mi"
+    closest_dist_str = f"{closest.distance_ft:.0f} ft" if units == "ft" else f"{closest.distance_mi:.2f} mi"
+    optimal_dist_str = f"{optimal.distance_ft:.0f} ft" if units == "ft" else f"{optimal.distance_mi:.2f} mi"
 
     # ----- main marker tooltips (hover) -----
     popup_html_current = f"""
-    <b>Closest Street:</b> {closest['STREET']}<br>
-    Spots Open: {int(closest['PRKG_SPLY'])}<br>
-    Coordinates: [{closest['center'][0]:.6f}, {closest['center'][1]:.6f}]<br>
+    <b>Closest Street:</b> {closest.street}<br>
+    Spots Open: {closest.supply}<br>
+    Coordinates: [{closest.center_lat:.6f}, {closest.center_lon:.6f}]<br>
     Distance: {closest_dist_str}<br><br>
-    <b>Suggested Optimal:</b> {optimal['STREET']}<br>
-    Spots Open: {int(optimal['PRKG_SPLY'])}<br>
-    Coordinates: [{optimal['center'][0]:.6f}, {optimal['center'][1]:.6f}]<br>
+    <b>Suggested Optimal:</b> {optimal.street}<br>
+    Spots Open: {optimal.supply}<br>
+    Coordinates: [{optimal.center_lat:.6f}, {optimal.center_lon:.6f}]<br>
     Distance: {optimal_dist_str}
     """
     popup_html_optimal = f"""
-    <b>Suggested Optimal:</b> {optimal['STREET']}<br>
-    Spots Open: {int(optimal['PRKG_SPLY'])}<br>
+    <b>Suggested Optimal:</b> {optimal.street}<br>
+    Spots Open: {optimal.supply}<br>
     Distance from Coordinates: {optimal_dist_str}
     """
     # User's query point (blue).
@@ -41,55 +171,32 @@ def build_map(
     ).add_to(m)
     # "Optimal" suggestion (green).
     folium.Marker(
-        location=optimal["center"],
+        location=optimal.center,
         tooltip=Tooltip(popup_html_optimal, sticky=True),
         icon=folium.Icon(color="green", icon="ok-sign"),
         **{"bubblingMouseEvents": False}
     ).add_to(m)
 
     # ----- cluster bubble styling -----
-    m.get_root().header.add_child(folium.Element(CLUSTER_CSS))
-
-    def availability_color(v) -> str:
-        try:
-            v = float(v)
-        except Exception:
-            v = 0.0
-        if v >= 16: return "darkgreen"
-        if v >= 12: return "lightgreen"
-        if v >= 8:  return "yellow"
-        if v >= 4:  return "orange"
-        return "red"
-
-    # ----- shaded markers (sample for performance) -----
-    subset = df.sample(min(len(df), max_markers), random_state=42)
-    parent = MarkerCluster().add_to(m) if use_clustering else m
-
-    for _, row in subset.iterrows():
-        lat_c = float(row["center_lat"])
-        lon_c = float(row["center_lon"])
-        est_open = float(row.get("EST_AVAILABLE", 0.0))
-        color = availability_color(est_open)
-
-        # A small circle representing availability matching.
-        cm = folium.CircleMarker(
-            location=(lat_c, lon_c),
-            radius=5, color="black", weight=0.5,
-            fill=True, fill_color=color, fill_opacity=0.6,
-            **{"bubblingMouseEvents": False}
-        )
-        cm.add_child(Tooltip(f"{row['STREET']}<br>Est Avail: {int(est_open)}", sticky=True))
-        cm.add_to(parent)
+    m.get_root().header.add_child(CLUSTER_ELEMENT)
+
+    # ----- supply layer: H3 hex bins (optional) or shaded markers -----
+    if show_hexbins and h3 is not None and "h3_cell" in df.columns:
+        folium.GeoJson(
+            build_hex_geojson(df, len(df)),
+            name="Supply hexbins (H3)",
+            style_function=lambda f: {
+                "fillColor": f["properties"]["color"], "color": "black", "weight": 0.3, "fillOpacity": 0.5,
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["tip"], labels=False, sticky=True),
+        ).add_to(m)
+    else:
+        _add_shaded_markers(m, df, use_clustering, max_markers)
 
     # ===== heatmap of estimated availability (red = fewer, green = more) =====
     if show_heatmap:
-        supply = pd.to_numeric(df["EST_AVAILABLE"], errors="coerce").fillna(0.0).clip(lower=0)
-        green_at  = 16.0   # make weight≈1.0 when EST_AVAILABLE is ~16 open spots
-        sharpness = 2.0    # >1 compresses mid values, so green is rarer
-        weights   = ((supply / green_at).clip(0, 1) ** sharpness).tolist()
-
         HeatMap(
-            list(zip(df["center_lat"], df["center_lon"], weights)),
+            build_heat_points(df, len(df)).tolist(),
             name="Open Spots Heatmap",
             radius=10, blur=10, max_zoom=16,
             max_val=3.0,        # keeps overlapping kernels from greening too fast
@@ -99,20 +206,7 @@ def build_map(
 
 
     # ----- legend -----
-    # This legend explains the quantile coloring of the street markers.
-    legend_html = """
-    <div style="position: fixed; bottom: 50px; left: 50px; width: 200px; height: 170px;
-         background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
-         padding: 10px;">
-         <b>Estimated Availability</b><br>
-         <i style="background:red; width:10px; height:10px; float:left; margin-right:6px;"></i> Very Low<br>
-         <i style="background:orange; width:10px; height:10px; float:left; margin-right:6px;"></i> Low<br>
-         <i style="background:yellow; width:10px; height:10px; float:left; margin-right:6px;"></i> Medium <br>
-         <i style="background:lightgreen; width:10px; height:10px; float:left; margin-right:6px;"></i> High<br>
-         <i style="background:darkgreen; width:10px; height:10px; float:left; margin-right:6px;"></i> Very High
-    </div>
-    """
-    m.get_root().html.add_child(folium.Element(legend_html))
+    m.get_root().html.add_child(LEGEND_ELEMENT)
     # Layer control lets users toggle layers
     folium.LayerControl().add_to(m)
 
@@ -3,9 +3,51 @@ import json
 import re
 from typing import Dict, Any
 import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
 
-from .geocode import ensure_sf, in_sf_bounds  # reuse the same SF helpers
-from .constants import OLLAMA_URL, OLLAMA_MODEL, SF_BBOX
+# optional faster JSON parser (bytes or str in, same objects out as json.loads)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except Exception:
+    orjson = None
+    _json_loads = json.loads
+
+from .geocode import ensure_sf, _match_poi_coords  # reuse the same SF helpers
+from .constants import OLLAMA_URL, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_OPTIONS, OLLAMA_TIMEOUT, SF_BBOX
+
+# SF bbox unpacked once; the coordinate checks below compare against these inline
+# (same rule as geocode.in_sf_bounds, without the call)
+_W, _S, _E, _N = SF_BBOX   # west, south, east, north
+
+# one pooled session for all Ollama calls: reuses the TCP connection across reruns
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4, pool_block=False))
+
+# compiled once at import (same patterns / flags as before, no per-call re cache lookups)
+_COORDS_RE = re.compile(r"(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)")
+_RADIUS_RE = re.compile(r"(\d+(\.\d+)?)\s*(mi|mile|miles)\b", re.I)
+_UNITS_FT_RE = re.compile(r"\bfeet|ft\b", re.I)
+_UNITS_MI_RE = re.compile(r"\bmi|mile|miles\b", re.I)
+_TEXT_RE = re.compile(r"[A-Za-z].+")   # any textual content
+_LETTERS_RE = re.compile(r"[A-Za-z]")
+# "<number> <name> <street type>", e.g. "500 castro st", "1 dr carlton b goodlett pl"
+_ADDRESS_RE = re.compile(
+    r"\d+[a-z]?\s+(?:[a-z0-9'.-]+\s+)+?"
+    r"(?:st|street|ave|avenue|blvd|boulevard|rd|road|dr|drive|way|pl|place|ct|court|ln|lane|ter|terrace|hwy)\.?",
+    re.I,
+)
+# capture: "top 4", "top4", "show 4", "4 top", "4 top suggestions", "4 suggestions", "4 results"
+# one alternation, so the text is scanned once instead of once per phrasing
+_TOPN_RE = re.compile(
+    r"\btop\s*(?P<a>\d{1,2})\b"                                   # top 4 / top4
+    r"|\bshow\s+(?P<b>\d{1,2})\b"                                 # show 4
+    r"|\b(?P<c>\d{1,2})\s*top\b"                                  # 4 top
+    r"|\b(?P<d>\d{1,2})\s*(?:results?|suggestions?|spots?)\b"     # 4 suggestions / 4 results
+    r"|\b(?:results?|suggestions?|spots?)\s*[:=]?\s*(?P<e>\d{1,2})\b",   # suggestions: 4
+    re.I,
+)
 
 SYSTEM_INSTRUCTIONS = """
 You convert natural-language parking intents into a compact JSON with optional keys:
@@ -37,106 +79,188 @@ User: "4 top suggestions near the Ferry Building"
 JSON: {"address":"Ferry Building, San Francisco, CA","top_n":4}
 """
 
-# ask the local Ollama model to convert the user's text into JSON.
-def _call_ollama(prompt: str) -> Dict[str, Any]:
-    try:
-        resp = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": SYSTEM_INSTRUCTIONS.strip() + "\nUser: " + prompt.strip() + "\nJSON:",
-                "stream": False,
-                "format": "json",
-                "options": {"temperature": 0.1},  # steadier JSON
-            },
-            timeout=20,
-        )
+def _balanced_json_end(text: str) -> int:
+    """
+    Index just past the first complete top-level {...} in text (string-aware brace
+    counting), or -1 if the object isn't closed yet.
+    """
+    start = text.find("{")
+    if start < 0:
+        return -1
+    depth, in_str, esc = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+def _stream_ollama_json(prompt: str, model: str = OLLAMA_MODEL) -> str:
+    """
+    Stream the generation and stop reading as soon as the first JSON object is
+    complete, instead of waiting for the model to finish (and pad) its answer.
+    """
+    text = ""
+    with _SESSION.post(
+        OLLAMA_URL,
+        json={
+            "model": model,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "prompt": SYSTEM_INSTRUCTIONS.strip() + "\nUser: " + prompt.strip() + "\nJSON:",
+            "stream": True,
+            "format": "json",            # constrain the output to valid JSON
+            "options": OLLAMA_OPTIONS,   # steadier JSON, capped length
+        },
+        timeout=OLLAMA_TIMEOUT,
+        stream=True,
+    ) as resp:
         resp.raise_for_status()
-        text = resp.json().get("response", "").strip()
-        m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-        if not m:
-            return {}
-        parsed = json.loads(m.group(0))
-
-        # Post-normalize to SF rules
-        if "address" in parsed and isinstance(parsed["address"], str):
-            # strip any stray angle brackets
-            parsed["address"] = parsed["address"].replace("<", "").replace(">", "").strip()
-            parsed["address"] = ensure_sf(parsed["address"])
-            # prefer address → drop any model lat/lon so we geocode/POI later
-            parsed.pop("lat", None)
-            parsed.pop("lon", None)
-
-        # If address not present but lat/lon are, keep them only if inside SF
-        elif "lat" in parsed and "lon" in parsed:
-            try:
-                la = float(parsed["lat"]); lo = float(parsed["lon"])
-                if not in_sf_bounds(la, lo):
-                    parsed.pop("lat", None); parsed.pop("lon", None)
-            except Exception:
+        for line in resp.iter_lines(chunk_size=None):    # yield each chunk as it arrives
+            if not line:
+                continue
+            chunk = _json_loads(line)
+            piece = chunk.get("response", "")
+            text += piece
+            if "}" in piece:
+                end = _balanced_json_end(text)
+                if end > 0:
+                    return text[text.find("{"):end]
+            if chunk.get("done"):
+                break
+    return text.strip()
+
+# ask the local Ollama model to convert the user's text into JSON.
+# Cached per (normalized query text, model) (deterministic options: temperature 0 + fixed seed);
+# the model itself gets the text as typed (_prompt is not hashed), so casing still helps it
+# pick out place names / addresses.
+# Failures raise inside the cached function, so they are never cached and a later call retries.
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _call_ollama_cached(key: str, model: str, _prompt: str) -> Dict[str, Any]:
+    text = _stream_ollama_json(_prompt, model)
+    # linear brace scan for the first complete object (no greedy regex backtracking)
+    end = _balanced_json_end(text)
+    if end < 0:
+        raise ValueError("no JSON object in the model output")
+    parsed = _json_loads(text[text.find("{"):end])
+
+    # Post-normalize to SF rules
+    if "address" in parsed and isinstance(parsed["address"], str):
+        # strip any stray angle brackets
+        parsed["address"] = parsed["address"].replace("<", "").replace(">", "").strip()
+        parsed["address"] = ensure_sf(parsed["address"])
+        # prefer address → drop any model lat/lon so we geocode/POI later
+        parsed.pop("lat", None)
+        parsed.pop("lon", None)
+
+    # If address not present but lat/lon are, keep them only if inside SF
+    elif "lat" in parsed and "lon" in parsed:
+        try:
+            la = float(parsed["lat"]); lo = float(parsed["lon"])
+            if not (_S <= la <= _N and _W <= lo <= _E):
                 parsed.pop("lat", None); parsed.pop("lon", None)
+        except Exception:
+            parsed.pop("lat", None); parsed.pop("lon", None)
 
-        return parsed
+    return parsed
+
+def _call_ollama(prompt: str) -> Dict[str, Any]:
+    try:
+        return _call_ollama_cached(_normalize_query(prompt), OLLAMA_MODEL, prompt)
     except Exception:
         return {}
 
+_WS_RE = re.compile(r"\s+")
+
+def _normalize_query(nl: str) -> str:
+    """Lowercase and collapse whitespace: the Ollama cache key, so case / spacing variants share an entry."""
+    return _WS_RE.sub(" ", nl.strip().lower())
+
 #  regex fallback if Ollama fails
 def _regex_fallback(nl: str) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
     txt = nl or ""
 
     # coords check
-    m = re.search(r"(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)", txt)
+    m = _COORDS_RE.search(txt)
     if m:
-        out["lat"] = float(m.group(1)); out["lon"] = float(m.group(2))
-        if not in_sf_bounds(out["lat"], out["lon"]):
-            out.pop("lat", None); out.pop("lon", None)
+        la = float(m.group(1)); lo = float(m.group(2))
+        if _S <= la <= _N and _W <= lo <= _E:      # only keep coords inside SF
+            out["lat"] = la; out["lon"] = lo
 
     # radius in miles
-    m = re.search(r"(\d+(\.\d+)?)\s*(mi|mile|miles)\b", txt, flags=re.I)
+    m = _RADIUS_RE.search(txt)
     if m:
         out["radius_mi"] = float(m.group(1))
 
     # units (ft or mi)
-    if re.search(r"\bfeet|ft\b", txt, flags=re.I):
+    if _UNITS_FT_RE.search(txt):
         out["units"] = "ft"
-    elif re.search(r"\bmi|mile|miles\b", txt, flags=re.I):
+    elif _UNITS_MI_RE.search(txt):
         out["units"] = "mi"
 
     # ----  top_n extraction ----
-    # capture: "top 4", "top4", "show 4", "4 top", "4 top suggestions", "4 suggestions", "4 results"
-    patterns = [
-        r"\btop\s*(\d{1,2})\b",                               # top 4 / top4
-        r"\bshow\s+(\d{1,2})\b",                              # show 4
-        r"\b(\d{1,2})\s*top\b",                               # 4 top
-        r"\b(\d{1,2})\s*(?:results?|suggestions?|spots?)\b",  # 4 suggestions / 4 results
-        r"\b(?:results?|suggestions?|spots?)\s*(?:=|:)?\s*(\d{1,2})\b", # suggestions: 4
-    ]
-    for pat in patterns:
-        m = re.search(pat, txt, flags=re.I)
-        if m:
-            n = int(m.group(1))
-            if 1 <= n <= 15:   # keep it reasonable
-                out["top_n"] = n
-                break
+    # first in-range count in reading order; an out-of-range hit ("pier 39 top 4")
+    # resumes one char later, so overlapping phrasings are still seen
+    m = _TOPN_RE.search(txt)
+    while m:
+        n = int(next(g for g in m.groups() if g))
+        if 1 <= n <= 15:   # keep it reasonable
+            out["top_n"] = n
+            break
+        m = _TOPN_RE.search(txt, m.start() + 1)
 
     # If no coords, try to treat the text as an SF place/address
     if "lat" not in out and "lon" not in out:
-        m = re.search(r"[A-Za-z].+", txt)   # any textual content
+        m = _TEXT_RE.search(txt)
         if m:
             out["address"] = ensure_sf(m.group(0).strip())
 
     return out
 
-# Try the LLM (Ollama) for structured JSON.
+def _regex_short_circuit(nl: str) -> Dict[str, Any]:
+    """
+    Regex parse for queries it fully covers, so they skip the Ollama round-trip:
+    bare SF coords, a bare "top N", or a plain place (a known POI like "pier 39" in
+    at most 3 words, or a street address like "500 castro st").
+    Anything with other wording ("keep it close", "37.8, -122.4 within 500 ft")
+    returns {} so the model can pick up the radius / alpha / beta phrasing.
+    """
+    fb = _regex_fallback(nl)
+    if "lat" in fb and "lon" in fb:
+        return fb if not _LETTERS_RE.search(_COORDS_RE.sub("", nl)) else {}
+    if "top_n" in fb and _TOPN_RE.fullmatch(nl):
+        return {"top_n": fb["top_n"]}
+    if set(fb) == {"address"}:
+        if _ADDRESS_RE.fullmatch(nl):
+            return {"address": ensure_sf(nl)}     # whole text: keep the house number
+        if len(nl.split()) <= 3 and _match_poi_coords(nl):
+            return fb
+    return {}
+
+# Try the regex short-circuit, then the LLM (Ollama) for structured JSON.
 # If that fails, use a simple regex-based parser.
 def parse_nl_query(nl: str) -> Dict[str, Any]:
     nl = (nl or "").strip()
     if not nl:
         return {}
     # normalize early
-    _nl = nl.lower()
+    _nl = _normalize_query(nl)
 
+    parsed = _regex_short_circuit(_nl)
+    if parsed:
+        return parsed
     parsed = _call_ollama(nl)
     if parsed:
         return parsed
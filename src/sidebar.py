@@ -3,6 +3,7 @@ from .utils import inject_sidebar_css
 from .nl_intent import parse_nl_query
 from .geocode import geocode_cached, GEOCODER_AVAILABLE
 from .constants import PRESETS
+from .data import H3_OK
 
 def render_sidebar():
     inject_sidebar_css()
@@ -202,6 +203,11 @@ def render_sidebar():
     show_heatmap = st.toggle("Show supply heatmap", value=False)
     use_clustering = st.toggle("Cluster shaded markers", value=True)
     max_markers = st.slider("Max shaded markers", 200, 5000, 1500, 100)
+    show_hexbins = st.toggle(
+        "Hex-bin supply (H3) instead of markers", value=False, disabled=not H3_OK,
+        help="Groups supply into H3 hexagons: a few hundred polygons instead of thousands of markers."
+             + ("" if H3_OK else " Requires `pip install h3`."),
+    )
 
     update_on_map_click = st.toggle("Update origin when I click the map", value=False)
 
@@ -215,6 +221,6 @@ def render_sidebar():
         lat, lon,
         units, max_mi,
         alpha, beta, top_n,
-        show_heatmap, use_clustering, max_markers,
+        show_heatmap, use_clustering, max_markers, show_hexbins,
         update_on_map_click,
     )
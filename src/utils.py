@@ -1,26 +1,30 @@
-import ast
 import math
+import numpy as np
 import streamlit as st
-from .constants import EARTH_RADIUS_MI
+from .constants import EARTH_RADIUS_MI, AVAILABILITY_THRESHOLDS, AVAILABILITY_COLORS
 
-def parse_listish(val):
-    if isinstance(val, (list, tuple)): return list(val)
-    if isinstance(val, str):
-        s = val.strip()
-        if (s.startswith("[") and s.endswith("]")) or (s.startswith("(") and s.endswith(")")):
-            try:
-                return list(ast.literal_eval(s))
-            except Exception:
-                return None
-    return None
+# scalar path: math functions bound as default args (LOAD_FAST instead of global + attribute lookups)
+def haversine_mi(lat1, lon1, lat2, lon2, _r=math.radians, _s=math.sin, _c=math.cos,
+                 _a=math.asin, _sq=math.sqrt, _two_r=2 * EARTH_RADIUS_MI):
+    sp = _s(_r(lat2 - lat1) / 2)
+    sl = _s(_r(lon2 - lon1) / 2)
+    return _two_r * _a(_sq(sp * sp + _c(_r(lat1)) * _c(_r(lat2)) * sl * sl))
 
-def haversine_mi(lat1, lon1, lat2, lon2):
-    R = EARTH_RADIUS_MI
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlmb = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
+def unit_xyz(lat_rad, lon_rad):
+    """(N, 3) unit-sphere vectors for radian coordinates; chord length between them is 2*sin(angle/2)."""
+    lat_rad = np.asarray(lat_rad, dtype=float)
+    lon_rad = np.asarray(lon_rad, dtype=float)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)])
+
+# ascending thresholds / colors for a branchless bucket lookup (NaN counts as "red")
+_THRESHOLDS_ASC = np.array(sorted(AVAILABILITY_THRESHOLDS), dtype=float)
+_COLORS_ASC = np.array(AVAILABILITY_COLORS[::-1], dtype=object)
+
+def availability_colors(est_open):
+    """Bucket color per EST_AVAILABLE value: a single np.searchsorted into the sorted thresholds."""
+    est_open = np.nan_to_num(np.asarray(est_open, dtype=float), nan=-np.inf)
+    return _COLORS_ASC[np.searchsorted(_THRESHOLDS_ASC, est_open, side="right")]
 
 def fmt_dist(ft_val: float, mi_val: float, units: str) -> str:
     return f"{ft_val:.0f} ft" if units == "ft" else f"{mi_val:.2f} mi"
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import data
+
+WKT_EDGE_CASES = [
+    "LINESTRING (-122.41 37.77, -122.42 37.78)",
+    "LINESTRING (-122 37, -121 38)",                  # integer coordinates
+    "LINESTRING (3.5e1 -1.2E+2, 4 5)",                # exponents
+    "LINESTRING(-122.4 37.7,-122.5 37.8)",            # no blanks around commas
+    "LINESTRING (1 2)",                               # single vertex: first == last
+    "LINESTRING (1\t2,  3   4)",                      # tabs / repeated blanks
+    "LINESTRING (1 2,\n3 4)",
+    "LINESTRING (1.5.3 2, 3 4)",                      # malformed tokens are skipped
+    "LINESTRING (1. 2, 3 4)",
+    "LINESTRING (e1 2, 3 4)",
+    "LINESTRING (+1 2, 3 4e)",                        # no valid pair at all
+    "LINESTRING (١٢ 3, 4 5)",               # non-ASCII digits are not numbers
+    "LINESTRING (12345678901234567890.5 1e-3, 2 3)",  # more digits than int64 holds
+    "1 2 3",
+    "POINT", "-", "", None, np.nan,
+]
+
+
+@pytest.mark.skipif(not data.NUMBA_OK, reason="numba not installed")
+def test_wkt_scanner_matches_regex(monkeypatch):
+    shape = pd.Series(WKT_EDGE_CASES, dtype=object)
+    monkeypatch.setattr(data, "WKT_NUMBA_MIN_ROWS", 0)
+    lat_nb, lon_nb = data._wkt_midpoints(shape)
+    monkeypatch.setattr(data, "NUMBA_OK", False)
+    lat_re, lon_re = data._wkt_midpoints(shape)
+    for case, got, want in zip(WKT_EDGE_CASES, np.column_stack([lat_nb, lon_nb]), np.column_stack([lat_re, lon_re])):
+        np.testing.assert_allclose(got, want, rtol=1e-12, equal_nan=True, err_msg=repr(case))
+
+
+def test_wkt_regex_midpoints():
+    lat, lon = data._wkt_midpoints(pd.Series(["LINESTRING (-122 37, -121 38)", "LINESTRING (3.5e1 1, 4 5)"]))
+    np.testing.assert_allclose(lat, [37.5, 3.0])
+    np.testing.assert_allclose(lon, [-121.5, 19.5])
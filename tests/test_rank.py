@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import rank
+from src.constants import EARTH_RADIUS_MI
+from src.utils import unit_xyz
+
+try:
+    from scipy.spatial import cKDTree
+except Exception:
+    cKDTree = None
+
+
+def _synthetic_df(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    supply = rng.integers(0, 40, n)
+    supply[rng.random(n) < 0.4] = 0          # plenty of empty segments near any origin
+    return pd.DataFrame({
+        "STREET": [f"ST {i}" for i in range(n)],
+        "PRKG_SPLY": supply.astype(np.int32),
+        "center_lat": rng.uniform(37.70, 37.83, n),
+        "center_lon": rng.uniform(-122.51, -122.36, n),
+    })
+
+
+def _brute_force_scores(df, lat, lon, alpha, beta, top_n):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    la, lo = np.radians(df["center_lat"].to_numpy()), np.radians(df["center_lon"].to_numpy())
+    a = np.sin((la - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(la) * np.sin((lo - lon1) / 2) ** 2
+    d_mi = 2 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(a))
+    score = df["PRKG_SPLY"].to_numpy() / (1 + alpha * d_mi ** beta)
+    return np.sort(score)[::-1][:top_n]
+
+
+def _search_paths(df):
+    coords_xyz = unit_xyz(np.radians(df["center_lat"].to_numpy()), np.radians(df["center_lon"].to_numpy()))
+    paths = [("chord", None, coords_xyz, False), ("haversine", None, None, False)]
+    if cKDTree is not None:
+        paths.append(("tree", cKDTree(coords_xyz), coords_xyz, False))
+    if rank.NUMBA_OK:
+        paths.append(("numba", None, None, True))
+    return paths
+
+
+@pytest.mark.parametrize("alpha,beta,top_n", [(0.8, 1.6, 5), (0.2, 1.0, 15), (3.0, 3.0, 1), (1.5, 2.0, 8)])
+def test_fallback_matches_brute_force(monkeypatch, alpha, beta, top_n):
+    # tiny radius: nothing is inside it, so every query goes through the nearest-K fallback
+    df = _synthetic_df()
+    rng = np.random.default_rng(1)
+    origins = list(zip(rng.uniform(37.69, 37.84, 25), rng.uniform(-122.53, -122.34, 25))) + [(37.90, -122.40)]
+    for name, kdt, coords_xyz, use_numba in _search_paths(df):
+        monkeypatch.setattr(rank, "NUMBA_OK", use_numba)
+        for lat, lon in origins:
+            _, _, fell_back = rank._query_candidates(df, kdt, coords_xyz, lat, lon, radius_mi=1e-4)
+            assert fell_back, name
+            got = rank.rank_candidates(df, kdt, coords_xyz, lat, lon, max_mi=1e-4,
+                                       alpha=alpha, beta=beta, top_n=top_n)
+            want = _brute_force_scores(df, lat, lon, alpha, beta, top_n)
+            np.testing.assert_allclose(got["__score"].to_numpy(dtype=float), want, rtol=1e-4, err_msg=name)